@@ -79,6 +79,9 @@ async def main():
             if signal_:
                 logger.info(f"收到信号 {signal_.name}...")
 
+            # 先停止媒体处理的后台协程，再取消其余任务
+            await event_handler.close()
+
             # 取消所有任务
             tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
             [task.cancel() for task in tasks]
@@ -6,9 +6,16 @@ from datetime import datetime
 from bilibili_api import video, Credential
 from bilibili_api.exceptions import NetworkException, ResponseCodeException
 from ..constants import BILIBILI_TEMP_DIR, BILIBILI_DEST_DIR
+from ..utils.file_utils import ensure_dirs
 
 logger = logging.getLogger(__name__)
 
+# 匹配BV号
+_BVID_RE = re.compile(r"BV\w{10}")
+
+# 标题中的非法文件名字符替换为下划线
+_ILLEGAL_TABLE = str.maketrans(dict.fromkeys('\\/:*?"<>|', "_"))
+
 
 class BilibiliHandler:
     def __init__(self, config):
@@ -22,14 +29,12 @@ class BilibiliHandler:
             self.set_credentials_from_cookie(self.cookie)
 
         # 确保目录存在
-        os.makedirs(BILIBILI_TEMP_DIR, exist_ok=True)
-        os.makedirs(BILIBILI_DEST_DIR, exist_ok=True)
+        ensure_dirs(BILIBILI_TEMP_DIR, BILIBILI_DEST_DIR)
 
     def extract_bvid(self, url):
         """从URL中提取BV号"""
         # 匹配BV号
-        bv_pattern = r"BV\w{10}"
-        match = re.search(bv_pattern, url)
+        match = _BVID_RE.search(url)
         if match:
             return match.group(0)
 
@@ -62,7 +67,7 @@ class BilibiliHandler:
             owner = info["owner"]["name"]
 
             # 生成安全的文件名
-            safe_title = re.sub(r'[\\/:*?"<>|]', "_", title)
+            safe_title = title.translate(_ILLEGAL_TABLE)
             filename = f"{safe_title}"
 
             # 下载视频
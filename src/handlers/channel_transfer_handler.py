@@ -6,6 +6,7 @@ from telethon import TelegramClient
 from telethon.tl.functions.messages import GetHistoryRequest
 from telethon.tl.types import Channel, MessageEntityTextUrl
 from telethon.errors import FloodWaitError
+from ..constants import TEMP_DIR
 
 logger = logging.getLogger(__name__)
 
@@ -24,15 +25,9 @@ class ChannelTransferHandler:
             client: Telegram客户端实例
         """
         self.client = client
-        # 创建临时目录
-        self.temp_dir = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "temp",
-        )
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
+        # 创建临时目录，路径预先规范化，后续拼接临时文件路径时直接使用
+        self.temp_dir = os.path.realpath(TEMP_DIR)
+        os.makedirs(self.temp_dir, exist_ok=True)
 
     async def get_entity(self, channel_id_or_username):
         """获取频道实体"""
@@ -72,9 +67,9 @@ class ChannelTransferHandler:
 
             # 将日期转换为时间戳（秒）
             since_timestamp = since_date.timestamp()
-            logger.info(
-                f"使用时间戳作为起始时间: {since_timestamp} ({since_date.strftime('%Y-%m-%d %H:%M:%S')})"
-            )
+            # 起始时间的文本形式只格式化一次，循环内的日志直接复用
+            since_str = since_date.strftime("%Y-%m-%d %H:%M:%S")
+            logger.info(f"使用时间戳作为起始时间: {since_timestamp} ({since_str})")
 
             # 获取频道消息历史
             messages = []
@@ -116,11 +111,11 @@ class ChannelTransferHandler:
                         messages.append(message)
                         now_message_count += 1
                         logger.info(
-                            f"消息时间戳 {message_timestamp} ({message_time_shanghai.strftime('%Y-%m-%d %H:%M:%S')}) >= 起始时间戳 {since_timestamp} ({since_date.strftime('%Y-%m-%d %H:%M:%S')})，添加"
+                            f"消息时间戳 {message_timestamp} ({message_time_shanghai.strftime('%Y-%m-%d %H:%M:%S')}) >= 起始时间戳 {since_timestamp} ({since_str})，添加"
                         )
                     else:
                         logger.info(
-                            f"消息时间戳 {message_timestamp} ({message_time_shanghai.strftime('%Y-%m-%d %H:%M:%S')}) < 起始时间戳 {since_timestamp} ({since_date.strftime('%Y-%m-%d %H:%M:%S')})，跳过"
+                            f"消息时间戳 {message_timestamp} ({message_time_shanghai.strftime('%Y-%m-%d %H:%M:%S')}) < 起始时间戳 {since_timestamp} ({since_str})，跳过"
                         )
                         break
 
@@ -172,7 +167,7 @@ class ChannelTransferHandler:
                         entities = None
 
                     # 检查消息是否包含photo
-                    if hasattr(message, "photo") and message.photo:
+                    if getattr(message, "photo", None):
                         # 下载照片到临时文件
                         temp_file_path = os.path.join(
                             self.temp_dir, f"photo_{message.id}.jpg"
@@ -244,16 +239,8 @@ class ChannelTransferHandler:
             since_date = since_date.replace(tzinfo=SHANGHAI_TIMEZONE)
 
         # 获取频道名称用于日志
-        source_name = (
-            source_channel.title
-            if hasattr(source_channel, "title")
-            else str(source_channel)
-        )
-        target_name = (
-            target_channel.title
-            if hasattr(target_channel, "title")
-            else str(target_channel)
-        )
+        source_name = getattr(source_channel, "title", None) or str(source_channel)
+        target_name = getattr(target_channel, "title", None) or str(target_channel)
 
         while True:
             logger.info(f"开始从 {source_name} 向 {target_name} 转发消息")
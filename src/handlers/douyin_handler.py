@@ -3,6 +3,7 @@ import shutil
 import logging
 from f2.apps.douyin.handler import DouyinHandler
 from src.constants import DOUYIN_DEST_DIR, DOUYIN_TEMP_DIR
+from src.utils.file_utils import ensure_dirs
 from f2.apps.douyin.utils import AwemeIdFetcher
 
 logger = logging.getLogger(__name__)
@@ -12,7 +13,7 @@ class CustomDouyinHandler:
     def __init__(self, cookie):
         self.cookie = cookie
         self.download_path = DOUYIN_TEMP_DIR
-        os.makedirs(self.download_path, exist_ok=True)
+        ensure_dirs(self.download_path)
 
     def get_download_config(self, url):
         """生成下载配置"""
@@ -51,18 +52,16 @@ class CustomDouyinHandler:
                 if desc
                 else f"{create}_{nickname}.mp4"
             )
+            dest_path = os.path.join(DOUYIN_DEST_DIR, filename)
             for root, dirs, files in os.walk(self.download_path):
                 for file in files:
                     if nickname and nickname in file and create and create in file:
-                        shutil.move(
-                            os.path.join(root, file),
-                            os.path.join(DOUYIN_DEST_DIR, filename),
-                        )
+                        shutil.move(os.path.join(root, file), dest_path)
                         try:
                             shutil.rmtree(root)
                         except Exception as e:
                             pass
-                        video["dest_path"] = os.path.join(DOUYIN_DEST_DIR, filename)
+                        video["dest_path"] = dest_path
                         return video
             return None
         except Exception as e:
@@ -2,16 +2,47 @@ import re
 import logging
 import os
 import asyncio
-from collections import defaultdict
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import suppress
 from telethon import events
-from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
-from .telegram_handler import TelegramHandler
+from .telegram_handler import TelegramHandler, inspect_media
 from .youtube_handler import YouTubeHandler
 from .douyin_handler import CustomDouyinHandler
 from .bilibili_handler import BilibiliHandler
+from ..constants import TEMP_DIR
 
 logger = logging.getLogger(__name__)
 
+# 最近已转发消息的记录条数上限，用于用户客户端与机器人客户端之间去重
+_TRANSFERRED_SIZE = 1024
+
+# 按音频发送的文件扩展名
+_AUDIO_EXTS = (".mp3", ".m4a", ".ogg", ".wav", ".flac")
+
+# 链接匹配规则（模块加载时预编译）
+# 消息路由按 YouTube → 抖音 → B站 的优先级依次匹配；YouTube 链接必须位于消息开头
+_ROUTER_RES = (
+    (
+        "youtube",
+        re.compile(r"(?:https?://)?(?:www\.|m\.)?(?:youtube\.com|youtu\.be)/\S*").match,
+    ),
+    ("douyin", re.compile(r"https?://v\.douyin\.com/\S+?/").search),
+    (
+        "bilibili",
+        re.compile(r"https?://(?:www\.bilibili\.com/video/|b23\.tv/)\S*").search,
+    ),
+)
+
+
+def _route_links(text):
+    """按优先级识别消息中的链接，返回（链接类型, 链接），没有可处理的链接时返回（None, None）"""
+    for kind, find in _ROUTER_RES:
+        match = find(text)
+        if match:
+            return kind, match.group()
+    return None, None
+
 
 class EventHandler:
     def __init__(self, config):
@@ -25,28 +56,55 @@ class EventHandler:
         self.send_file = config.get("send_file", False)
         self.transfer_config = config.get("transfer_message", [])
 
-        # 创建临时目录
-        self.temp_dir = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "temp",
+        # 按源聊天（str(ID) 或 @用户名）索引转发规则，避免每条消息遍历全部规则
+        # 每条规则的关键词预编译为一个正则，一次扫描即可判断是否命中任一关键词
+        self._transfer_rules = {}
+        for transfer in self.transfer_config:
+            source_chat = transfer.get("source_chat")
+            if source_chat:
+                keywords = transfer.get("include_keywords") or []
+                keyword_re = (
+                    re.compile("|".join(map(re.escape, keywords))) if keywords else None
+                )
+                self._transfer_rules.setdefault(str(source_chat), []).append(
+                    (transfer, keyword_re)
+                )
+        self._has_username_rules = any(
+            key.startswith("@") for key in self._transfer_rules
         )
-        if not os.path.exists(self.temp_dir):
-            os.makedirs(self.temp_dir)
+        # 最近已转发的（源聊天, 消息ID, 目标聊天），用户客户端和机器人客户端都会收到同一条消息，
+        # 先到的一方登记后另一方跳过；按先后顺序淘汰以限制内存
+        self._transferred = OrderedDict()
+
+        # 创建临时目录，路径预先规范化，后续拼接临时文件路径时直接使用
+        self.temp_dir = os.path.realpath(TEMP_DIR)
+        os.makedirs(self.temp_dir, exist_ok=True)
 
         # 媒体组处理相关
         self.media_groups = defaultdict(list)
         self.group_tasks = {}
+        self.group_started = {}  # 媒体组首条消息到达的时间，用于清理残留的组
+        self._group_gc_task = None
         self.media_group_delay = config.get("media_group_delay", 3.0)  # 媒体组等待时间
+        # 媒体组并发下载数，避免同时请求过多触发 FLOOD_WAIT
+        self._download_sem = asyncio.Semaphore(config.get("parallel_downloads", 4))
+
+    async def close(self):
+        """停止后台处理协程：媒体组清理任务、等待中的媒体组任务和媒体处理协程"""
+        tasks = list(self.group_tasks.values())
+        if self._group_gc_task is not None:
+            tasks.append(self._group_gc_task)
+            self._group_gc_task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.telegram_handler.close()
 
     async def send_video_to_user(self, event, file_path):
         """统一的发送文件方法"""
         if self.send_file:
             # 判断是视频还是音频
-            is_audio = file_path.lower().endswith(
-                (".mp3", ".m4a", ".ogg", ".wav", ".flac")
-            )
+            is_audio = file_path.lower().endswith(_AUDIO_EXTS)
 
             if is_audio:
                 # 音频文件
@@ -79,82 +137,22 @@ class EventHandler:
         async def handle_message_transfer(event):
             """处理来自任何聊天的新消息并进行转发"""
             try:
-                # 获取当前聊天的ID
-                chat = await event.get_chat()
-                group_id = event.chat_id
-                chat_username = getattr(chat, "username", None)
-
-                # 遍历转发配置
-                for transfer in self.transfer_config:
-                    source_chat = transfer.get("source_chat")
-
-                    # 检查是否匹配源聊天（通过ID或用户名）
-                    source_match = False
-                    if source_chat and (
-                        str(group_id) == str(source_chat)
-                        or (chat_username and f"@{chat_username}" == source_chat)
+                # 根据当前聊天的ID（及用户名）查找匹配的转发规则
+                rules = list(self._transfer_rules.get(str(event.chat_id), ()))
+                if self._has_username_rules:
+                    chat = await event.get_chat()
+                    chat_username = getattr(chat, "username", None)
+                    if chat_username:
+                        rules += self._transfer_rules.get(f"@{chat_username}", ())
+
+                for transfer, keyword_re in rules:
+                    # 如果指定了关键词，至少匹配一个关键词才转发
+                    if keyword_re is None or keyword_re.search(
+                        event.message.text or ""
                     ):
-                        source_match = True
-
-                    if source_match:
-                        target_chat = transfer.get("target_chat")
-                        include_keywords = transfer.get("include_keywords", [])
-                        direct = transfer.get("direct", False)
-                        # 检查是否需要根据关键词过滤
-                        should_transfer = True
-                        if include_keywords:
-                            message_text = (
-                                event.message.text if event.message.text else ""
-                            )
-                            # 如果指定了关键词，至少匹配一个关键词才转发
-                            should_transfer = any(
-                                keyword in message_text for keyword in include_keywords
-                            )
-
-                        if should_transfer:
-                            try:
-                                if direct:
-                                    logger.info(f"直接转发消息: {event.message.text}")
-                                    # 检查消息是否包含photo
-                                    if event.message.photo:
-                                        # 如果有照片，下载到临时文件再发送
-                                        temp_file_path = os.path.join(
-                                            self.temp_dir,
-                                            f"photo_{event.message.id}.jpg",
-                                        )
-                                        await event.message.download_media(
-                                            temp_file_path
-                                        )
-
-                                        # 发送文本和照片
-                                        await client.send_message(
-                                            target_chat,
-                                            (
-                                                event.message.text
-                                                if event.message.text
-                                                else ""
-                                            ),
-                                            file=temp_file_path,
-                                        )
-
-                                        # 删除临时文件
-                                        if os.path.exists(temp_file_path):
-                                            os.remove(temp_file_path)
-                                    else:
-                                        # 没有照片，只发送文本
-                                        await client.send_message(
-                                            target_chat, event.message.text
-                                        )
-                                else:
-                                    # 转发消息
-                                    await client.forward_messages(
-                                        target_chat, event.message
-                                    )
-                                    logger.info(
-                                        f"已将消息从 {source_chat} 转发到 {target_chat}"
-                                    )
-                            except Exception as e:
-                                logger.error(f"转发消息时出错: {str(e)}")
+                        await self._do_transfer(
+                            event, client, transfer, transfer.get("direct", False)
+                        )
 
             except Exception as e:
                 logger.error(f"处理消息转发时出错: {str(e)}")
@@ -181,21 +179,14 @@ class EventHandler:
 
                 message_text = event.message.text if event.message.text else ""
 
-                # 检查是否是YouTube链接
-                youtube_pattern = r"(https?://)?(www\.)?(youtube\.com|youtu\.be)/.*|(https?://)?(m\.)?(youtube\.com|youtu\.be)/.*"
-                douyin_pattern = r"https://v\.douyin\.com/.*?/"
-                is_youtube = bool(re.match(youtube_pattern, message_text))
-                is_douyin = bool(re.search(douyin_pattern, message_text))
-                is_bilibili = (
-                    "bilibili.com" in event.message.text
-                    or "b23.tv" in event.message.text
-                )
-                if is_youtube:
-                    await self._handle_youtube_message(event)
-                elif is_douyin:
-                    await self._handle_douyin_message(event)
-                elif is_bilibili:
-                    await self.handle_bilibili_message(event)
+                # 识别消息中的链接类型
+                kind, url = _route_links(message_text)
+                if kind == "youtube":
+                    await self._handle_youtube_message(event, url)
+                elif kind == "douyin":
+                    await self._handle_douyin_message(event, url)
+                elif kind == "bilibili":
+                    await self.handle_bilibili_message(event, url)
                 elif event.message.media:
                     await self._handle_telegram_media(event)
 
@@ -214,10 +205,15 @@ class EventHandler:
 
             # 如果这个组还没有处理任务，创建一个延迟任务
             if group_id not in self.group_tasks:
+                self.group_started[group_id] = time.monotonic()
                 self.group_tasks[group_id] = asyncio.create_task(
                     self._process_media_group_with_delay(group_id)
                 )
 
+            # 首次收到媒体组时启动残留媒体组的定期清理
+            if self._group_gc_task is None:
+                self._group_gc_task = asyncio.create_task(self._gc_stale_groups())
+
             await event.reply(f"📸 检测到媒体组消息，正在等待所有媒体到达...")
 
         except Exception as e:
@@ -226,6 +222,7 @@ class EventHandler:
 
     async def _process_media_group_with_delay(self, group_id):
         """等待一段时间后处理完整的媒体组"""
+        messages = []
         try:
             # 等待指定时间，确保所有媒体消息都到达
             await asyncio.sleep(self.media_group_delay)
@@ -240,68 +237,42 @@ class EventHandler:
 
             logger.info(f"开始处理媒体组 {group_id}, 包含 {len(messages)} 个媒体")
 
-            # 下载所有媒体文件到临时目录
+            # 并发下载所有媒体文件到临时目录
+            results = await asyncio.gather(
+                *(
+                    self._download_group_media(i, message)
+                    for i, message in enumerate(messages)
+                    if message.media
+                ),
+                return_exceptions=True,
+            )
             downloaded_files = []
-            for i, message in enumerate(messages):
-                if message.media:
-                    try:
-                        # 下载媒体文件到临时目录
-                        temp_file_path = await message.download_media(file=self.temp_dir)
-                        
-                        # 获取原始文件名
-                        original_filename = os.path.basename(temp_file_path)
-                        
-                        # 确定媒体类型
-                        if isinstance(message.media, MessageMediaPhoto):
-                            media_type = 'photo'
-                        elif isinstance(message.media, MessageMediaDocument):
-                            # 检查是否是视频
-                            document = message.media.document
-                            if hasattr(document, 'mime_type') and document.mime_type.startswith('video/'):
-                                media_type = 'video'
-                            else:
-                                media_type = 'other'
-                        else:
-                            media_type = 'other'
-                        
-                        downloaded_files.append({
-                            'temp_path': temp_file_path,
-                            'original_filename': original_filename,
-                            'type': media_type,
-                            'message_id': message.id,
-                            'index': i
-                        })
-                        logger.info(f"媒体组文件下载成功: {temp_file_path} (类型: {media_type})")
-                    except Exception as e:
-                        logger.error(f"下载媒体组文件时出错: {str(e)}")
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.error(f"下载媒体组文件时出错: {str(result)}")
+                else:
+                    downloaded_files.append(result)
 
             # 处理媒体组文件
             if downloaded_files:
-                # 统计文件信息
-                total_files = len(downloaded_files)
-                photo_count = sum(1 for f in downloaded_files if f['type'] == 'photo')
-                video_count = sum(1 for f in downloaded_files if f['type'] == 'video')
-                other_count = total_files - photo_count - video_count
-                
-                logger.info(f"媒体组 {group_id} 统计: {total_files}个文件, {photo_count}张图片, {video_count}个视频, {other_count}个其他文件")
-                
+                # 文件统计由 process_media_group 在分类时一并完成
                 success, result = await self.telegram_handler.process_media_group(
                     group_id, downloaded_files, caption
                 )
-                
+
                 if success:
                     # 发送处理完成的通知
                     first_message = messages[0]
                     try:
                         summary_msg = (
                             f"✅ 媒体组处理完成！\n"
-                            f"📁 目录: {os.path.basename(result['directory'])}\n"
-                            f"📊 统计: {total_files}个文件\n"
-                            f"🖼️ 图片: {photo_count}张\n"
-                            f"🎬 视频: {video_count}个"
+                            f"📁 目录: {result['directory_name']}\n"
+                            f"📊 统计: {result['total_files']}个文件\n"
+                            f"🖼️ 图片: {result['photo_count']}张\n"
+                            f"🎬 视频: {result['video_count']}个"
                         )
-                        if other_count > 0:
-                            summary_msg += f"\n📎 其他: {other_count}个"
+                        if result["other_count"] > 0:
+                            summary_msg += f"\n📎 其他: {result['other_count']}个"
                         
                         await first_message.reply(summary_msg)
                         logger.info(f"媒体组 {group_id} 处理完成: {result}")
@@ -316,20 +287,8 @@ class EventHandler:
                     except Exception as e:
                         logger.error(f"发送媒体组失败通知时出错: {str(e)}")
 
-            # 清理
-            if group_id in self.media_groups:
-                del self.media_groups[group_id]
-            if group_id in self.group_tasks:
-                del self.group_tasks[group_id]
-
         except Exception as e:
             logger.error(f"处理媒体组延迟任务时出错: {str(e)}")
-            # 清理出错的组
-            if group_id in self.media_groups:
-                del self.media_groups[group_id]
-            if group_id in self.group_tasks:
-                del self.group_tasks[group_id]
-            
             # 尝试发送错误通知
             try:
                 if messages and len(messages) > 0:
@@ -337,6 +296,54 @@ class EventHandler:
             except:
                 pass
 
+        finally:
+            # 无论成功、失败还是任务被取消，都清理该媒体组
+            self._drop_media_group(group_id)
+
+    def _drop_media_group(self, group_id):
+        """移除媒体组的缓存数据"""
+        self.media_groups.pop(group_id, None)
+        self.group_tasks.pop(group_id, None)
+        self.group_started.pop(group_id, None)
+
+    async def _gc_stale_groups(self, interval=60):
+        """定期清理超时且已没有处理任务的媒体组，防止内存持续增长"""
+        while True:
+            await asyncio.sleep(interval)
+            deadline = time.monotonic() - 10 * self.media_group_delay
+            for group_id, started in list(self.group_started.items()):
+                task = self.group_tasks.get(group_id)
+                if started < deadline and (task is None or task.done()):
+                    logger.warning(f"清理残留的媒体组 {group_id}")
+                    self._drop_media_group(group_id)
+
+    async def _download_group_media(self, index, message):
+        """下载媒体组中的单个媒体文件"""
+        # 确定媒体类型：复用 TelegramHandler 的媒体解析，一次读取文档属性
+        # 媒体组只区分图片、视频和其他文件，音频按其他文件处理
+        media_type = inspect_media(message.media).kind
+        if media_type == "audio":
+            media_type = "other"
+
+        # 获取原始文件名；并发下载时以消息ID区分临时文件，避免同名覆盖
+        original_filename = (
+            message.file.name or f"{media_type}_{message.id}{message.file.ext}"
+        )
+        temp_file_path = f"{self.temp_dir}{os.sep}{message.id}_{original_filename}"
+
+        async with self._download_sem:
+            # 下载媒体文件到临时目录
+            temp_file_path = await message.download_media(file=temp_file_path)
+
+        logger.info(f"媒体组文件下载成功: {temp_file_path} (类型: {media_type})")
+        return {
+            "temp_path": temp_file_path,
+            "original_filename": original_filename,
+            "type": media_type,
+            "message_id": message.id,
+            "index": index,
+        }
+
     async def _handle_message_transfer(self, event):
         """处理消息转发（适用于机器人客户端）"""
         if not self.transfer_config:
@@ -346,94 +353,82 @@ class EventHandler:
         if event.message.grouped_id:
             return
 
-        # 获取当前聊天的ID
-        chat_id = event.chat_id
+        # 根据当前聊天的ID查找匹配的转发规则
+        for transfer, keyword_re in self._transfer_rules.get(str(event.chat_id), ()):
+            # 如果指定了关键词，至少匹配一个关键词才转发
+            if keyword_re is None or keyword_re.search(event.message.text or ""):
+                await self._do_transfer(
+                    event, event.client, transfer, bool(event.message.photo)
+                )
 
-        # 遍历转发配置
-        for transfer in self.transfer_config:
-            source_chat = transfer.get("source_chat")
-            target_chat = transfer.get("target_chat")
-            include_keywords = transfer.get("include_keywords", [])
-
-            # 检查是否匹配源聊天
-            if str(chat_id) == str(source_chat):
-                # 检查是否需要根据关键词过滤
-                should_transfer = True
-                if include_keywords:
-                    message_text = event.message.text if event.message.text else ""
-                    # 如果指定了关键词，至少匹配一个关键词才转发
-                    should_transfer = any(
-                        keyword in message_text for keyword in include_keywords
-                    )
+    async def _do_transfer(self, event, client, transfer, copy):
+        """按转发规则将消息发送到目标聊天，copy 为真时重新发送内容而不是转发"""
+        source_chat = transfer.get("source_chat")
+        target_chat = transfer.get("target_chat")
+        message = event.message
 
-                if should_transfer:
-                    try:
-                        # 检查消息是否包含photo
-                        if event.message.photo:
-                            # 如果有照片，下载到临时文件再发送
-                            temp_file_path = os.path.join(
-                                self.temp_dir, f"photo_{event.message.id}.jpg"
-                            )
-                            await event.message.download_media(temp_file_path)
-
-                            # 发送文本和照片
-                            await event.client.send_message(
-                                target_chat,
-                                (event.message.text if event.message.text else ""),
-                                file=temp_file_path,
-                            )
-
-                            # 删除临时文件
-                            if os.path.exists(temp_file_path):
-                                os.remove(temp_file_path)
-
-                            logger.info(
-                                f"已将图文消息从 {source_chat} 发送到 {target_chat}"
-                            )
-                        else:
-                            # 转发消息
-                            await event.client.forward_messages(
-                                target_chat, event.message
-                            )
-                            logger.info(
-                                f"已将消息从 {source_chat} 转发到 {target_chat}"
-                            )
-                    except Exception as e:
-                        logger.error(f"转发消息时出错: {str(e)}")
+        # 同一条消息只转发一次：检查与登记之间没有 await，不会被另一个客户端插入
+        key = (event.chat_id, message.id, str(target_chat))
+        if key in self._transferred:
+            return
+        self._transferred[key] = None
+        if len(self._transferred) > _TRANSFERRED_SIZE:
+            self._transferred.popitem(last=False)
 
-    async def _handle_douyin_message(self, event):
         try:
-            match = re.findall(r"https?://v\.douyin\.com/.*?/", event.message.text)
-            if match:
-                await event.reply(f"开始下载抖音视频: {match[0]}")
-                url = match[0]
-                video = await self.douyin_handler.download_video(url)
-                if video:
-                    await event.reply(
-                        f"✅ 抖音视频下载完成！\n"
-                        f"标题: {video.get('desc')}\n"
-                        f"保存位置: {video.get('dest_path')}"
+            if not copy:
+                # 转发消息
+                await client.forward_messages(target_chat, message)
+                logger.info(f"已将消息从 {source_chat} 转发到 {target_chat}")
+            elif message.photo:
+                # 如果有照片，下载到临时文件再连同文本一起发送
+                temp_file_path = f"{self.temp_dir}{os.sep}photo_{message.id}.jpg"
+                try:
+                    await message.download_media(temp_file_path)
+                    await client.send_message(
+                        target_chat, message.text or "", file=temp_file_path
                     )
-                else:
-                    await event.reply("无法下载该抖音视频，请检查链接是否有效。")
+                finally:
+                    # 删除临时文件
+                    with suppress(FileNotFoundError):
+                        os.remove(temp_file_path)
+                logger.info(f"已将图文消息从 {source_chat} 发送到 {target_chat}")
+            else:
+                # 没有照片，只发送文本
+                await client.send_message(target_chat, message.text)
+                logger.info(f"已将文本消息从 {source_chat} 发送到 {target_chat}")
+        except Exception as e:
+            logger.error(f"转发消息时出错: {str(e)}")
+
+    async def _handle_douyin_message(self, event, url):
+        """处理抖音链接消息，url 为路由阶段匹配到的链接"""
+        try:
+            await event.reply(f"开始下载抖音视频: {url}")
+            video = await self.douyin_handler.download_video(url)
+            if video:
+                await event.reply(
+                    f"✅ 抖音视频下载完成！\n"
+                    f"标题: {video.get('desc')}\n"
+                    f"保存位置: {video.get('dest_path')}"
+                )
             else:
                 await event.reply("无法下载该抖音视频，请检查链接是否有效。")
         except Exception as e:
             await event.reply(f"下载抖音视频时出错: {str(e)}")
 
-    async def _handle_youtube_message(self, event):
+    async def _handle_youtube_message(self, event, url):
         """处理YouTube链接消息"""
         status_message = await event.reply("开始解析YouTube下载链接...")
         try:
             success, result = await self.youtube_handler.download_video(
-                event.message.text,
+                url,
                 lambda msg: status_message.edit(msg) if status_message else None,
             )
 
             if success:
                 # 判断下载的文件类型
                 file_type = "视频"
-                if result.lower().endswith((".mp3", ".m4a", ".ogg", ".wav", ".flac")):
+                if result.lower().endswith(_AUDIO_EXTS):
                     file_type = "音频"
 
                 await event.reply(
@@ -468,25 +463,20 @@ class EventHandler:
         except Exception as e:
             await event.reply(f"处理媒体文件时出错: {str(e)}")
 
-    async def handle_bilibili_message(self, message):
-        """处理B站消息"""
+    async def handle_bilibili_message(self, message, url):
+        """处理B站消息，url 为路由阶段匹配到的链接"""
         try:
             await message.reply("正在下载B站视频，请稍候...")
-            url = re.findall(
-                r"https://www\.bilibili\.com/video/.*|https://b23\.tv/.*", message.text
-            )
-            if url:
-                video = await self.bilibili_handler.download_video(url[0])
-                if video:
-                    await message.reply(
-                        f"✅ B站视频下载完成！\n"
-                        f"标题: {video.get('title')}\n"
-                        f"保存位置: {video.get('path')}"
-                    )
-                    return True
-            else:
-                await message.reply("下载B站视频失败,请检查链接是否有效")
-                return False
+            video = await self.bilibili_handler.download_video(url)
+            if video:
+                await message.reply(
+                    f"✅ B站视频下载完成！\n"
+                    f"标题: {video.get('title')}\n"
+                    f"保存位置: {video.get('path')}"
+                )
+                return True
+            await message.reply("下载B站视频失败,请检查链接是否有效")
+            return False
 
         except Exception as e:
             await message.reply(f"处理B站视频失败: {str(e)}")
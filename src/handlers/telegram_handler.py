@@ -1,9 +1,23 @@
 import os
+import asyncio
 import re
+import time
 import logging
-import shutil
+import itertools
+import contextlib
+import functools
+import mimetypes
+from dataclasses import dataclass
+from types import MappingProxyType
 from datetime import datetime
-from ..utils.file_utils import move_file
+from telethon.errors import FloodWaitError
+from telethon.tl.types import (
+    DocumentAttributeAudio,
+    DocumentAttributeFilename,
+    MessageMediaDocument,
+    MessageMediaPhoto,
+)
+from ..utils.file_utils import ensure_dirs, fast_move, reserve_unique_path
 from ..constants import (
     TELEGRAM_TEMP_DIR,
     TELEGRAM_VIDEOS_DIR,
@@ -15,10 +29,241 @@ from ..constants import (
 
 logger = logging.getLogger(__name__)
 
+# 常见MIME类型对应的文件扩展名（优先于 mimetypes 的猜测结果），只读
+_MIME_TO_EXT = MappingProxyType(
+    {
+        "video/mp4": ".mp4",
+        "video/quicktime": ".mov",
+        "video/x-matroska": ".mkv",
+        "video/webm": ".webm",
+        "video/x-msvideo": ".avi",
+        "audio/mpeg": ".mp3",
+        "audio/mp4": ".m4a",
+        "audio/x-m4a": ".m4a",
+        "audio/ogg": ".ogg",
+        "audio/flac": ".flac",
+        "audio/x-flac": ".flac",
+        "audio/wav": ".wav",
+        "audio/x-wav": ".wav",
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/webp": ".webp",
+        "image/gif": ".gif",
+    }
+)
+
+# Windows和Linux中的非法文件名字符（含控制字符），清理时直接删除
+_SANITIZE_TABLE = str.maketrans(dict.fromkeys([*'<>:"/\\|?*', *map(chr, range(0x20))]))
+
+# 中文检测使用的正则（模块加载时预编译），只需判断是否存在中文字符，命中第一个字符即可返回
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+
+# 分块并发下载：每块 512KB（Telethon 单次 getFile 请求的上限，等于该值时一块只发一次请求），
+# 超过阈值的文件才启用
+_CHUNK_SIZE = 512 * 1024
+_PARALLEL_MIN_SIZE = 16 * 1024 * 1024
+
+# 媒体组目录的公共前缀（视频目录 + 分隔符），模块加载时拼好
+_VIDEOS_PREFIX = TELEGRAM_VIDEOS_DIR.rstrip(os.sep) + os.sep
+
+# 自动生成文件名的后缀：进程启动时间 + 单调递增计数，保证同一秒内也不会重名
+_FN_EPOCH = f"{int(time.time()):x}"
+_FN_COUNTER = itertools.count()
+
+
+def _unique_suffix():
+    """生成自动文件名使用的唯一后缀"""
+    return f"{_FN_EPOCH}_{next(_FN_COUNTER):x}"
+
+
+def _get_file_extension(mime_type):
+    """根据MIME类型获取文件扩展名"""
+    # 常见类型直接查表，其余交给标准库 mimetypes，都查不到时退回到子类型名
+    ext = _MIME_TO_EXT.get(mime_type) or mimetypes.guess_extension(mime_type)
+    return ext if ext else f".{mime_type.rpartition('/')[2]}"
+
+
+@dataclass(slots=True)
+class MediaInfo:
+    """媒体消息的解析结果，每条消息只解析一次"""
+
+    kind: str  # video / audio / photo / other
+    mime: str
+    ext: str
+    orig_name: str | None = None  # 文档自带的文件名
+    title: str | None = None  # 文档自带的标题（如音频标题）
+
+
+# 媒体类型对应的保存目录
+_KIND_TO_DIR = {
+    "video": TELEGRAM_VIDEOS_DIR,
+    "audio": TELEGRAM_AUDIOS_DIR,
+    "photo": TELEGRAM_PHOTOS_DIR,
+}
+
+# 文档按 MIME 主类型归类（以文件形式发送的图片也归为 photo），未列出的主类型都归为 other
+_MIME_PREFIX_KIND = {
+    "video": "video",
+    "audio": "audio",
+    "image": "photo",
+}
+
+
+def inspect_media(media):
+    """解析媒体对象的类型、MIME、扩展名和文件名"""
+    if isinstance(media, MessageMediaDocument) and media.document is not None:
+        doc = media.document
+        mime = doc.mime_type or ""
+        kind = _MIME_PREFIX_KIND.get(mime.partition("/")[0], "other")
+
+        # 按属性顺序取第一个文件名或（音频）标题，按属性类型判断而不是逐个探测字段
+        orig_name = title = None
+        for attr in doc.attributes:
+            if isinstance(attr, DocumentAttributeFilename) and attr.file_name:
+                orig_name = attr.file_name
+                break
+            if isinstance(attr, DocumentAttributeAudio) and attr.title:
+                title = attr.title
+                break
+
+        # 优先使用文档自带文件名的扩展名
+        ext = os.path.splitext(orig_name)[1] if orig_name else ""
+        if not ext and mime:
+            ext = _get_file_extension(mime)
+
+        return MediaInfo(
+            kind=kind,
+            mime=mime,
+            ext=ext,
+            orig_name=orig_name,
+            title=title,
+        )
+    if isinstance(media, MessageMediaPhoto):
+        return MediaInfo(kind="photo", mime="image/jpeg", ext=".jpg")
+    return MediaInfo(kind="other", mime="", ext="")
+
+
+def _remove_quietly(*paths):
+    """删除文件，文件不存在时忽略"""
+    for path in paths:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+
+def _discard_reserved(task):
+    """占位任务的完成回调：占位成功时删除占位文件"""
+    if not task.cancelled() and task.exception() is None:
+        _remove_quietly(task.result())
+
+
+def _close_after(fd, future):
+    """Future 完成后关闭文件描述符，并取出其异常，避免“异常从未被获取”的警告"""
+    if not future.cancelled():
+        future.exception()
+    os.close(fd)
+
+
+def _preallocate(fd, size):
+    """预先为文件分配磁盘空间，并发分块写入时不再逐块扩展文件；不支持时退回 ftruncate"""
+    if hasattr(os, "posix_fallocate"):
+        try:
+            os.posix_fallocate(fd, 0, size)
+            return
+        except OSError:
+            pass
+    os.ftruncate(fd, size)
+
+
+def _unique_name(name, existing):
+    """在已占用的文件名集合中为 name 选一个不冲突的名称，并登记到集合中"""
+    candidate = name
+    base, ext = os.path.splitext(name)
+    n = 1
+    while candidate in existing:
+        candidate = f"{base}_{n}{ext}"
+        n += 1
+    existing.add(candidate)
+    return candidate
+
+
+def _has_cjk(text):
+    """判断文本中是否包含中文字符"""
+    return _CJK_RE.search(text) is not None
+
+
+def _sanitize(filename):
+    """清理文件名中的非法字符"""
+    # 移除Windows和Linux中的非法文件名字符，去掉首尾的点号和空格并限制长度
+    return filename.translate(_SANITIZE_TABLE).strip(". ")[:200]
+
+
+def _split_bracket_title(text):
+    """用 str.find 查找同一行内的【】，返回（【】中的内容，其后直到换行或#标签之前的部分）"""
+    start = text.find("【")
+    while start != -1:
+        end = text.find("】", start + 1)
+        if end == -1:
+            return None
+        newline = text.find("\n", start + 1, end)
+        if newline == -1:
+            break
+        # 【】跨行时从下一行继续查找
+        start = text.find("【", newline + 1)
+    else:
+        return None
+
+    # 跳过】后的空白（含换行），取到下一个换行或#标签为止
+    rest = end + 1
+    length = len(text)
+    while rest < length and text[rest].isspace():
+        rest += 1
+    stop = length
+    for sep in ("\n", "#"):
+        pos = text.find(sep, rest, stop)
+        if pos != -1:
+            stop = pos
+    return text[start + 1 : end], text[rest:stop].strip()
+
+
+@functools.lru_cache(maxsize=1024)
+def _extract_title_cached(message_text):
+    """从消息文本中提取标题；同一条文本在一次处理中会被多次解析，结果按文本缓存"""
+    if not message_text:
+        return "无标题媒体组"
+
+    # 尝试匹配【】中的内容及其后的标题部分
+    parts = _split_bracket_title(message_text)
+
+    if parts:
+        # 组合标题，并清理标题中的非法文件名字符
+        return _sanitize(f"【{parts[0]}】{parts[1]}")
+
+    # 如果没有找到【】格式的标题，返回原始文本的第一行（直到换行符）
+    first_line = message_text.partition("\n")[0].strip()
+    # 移除可能的标签部分（以#开头的内容）
+    first_line = first_line.partition("#")[0].strip()
+    # 清理非法字符
+    first_line = _sanitize(first_line)
+
+    return first_line if first_line else "无标题媒体组"
+
+
+def _dir_for(info):
+    """根据媒体类型确定目标目录"""
+    return _KIND_TO_DIR.get(info.kind, TELEGRAM_OTHERS_DIR)
+
 
 class TelegramHandler:
     def __init__(self, config):
         self.config = config
+        # 大文件分块并发下载的协程数，设为 1 时使用 Telethon 默认的顺序下载
+        self.download_workers = max(1, config.get("download_workers", 4))
+        # 所有文件共享的分块请求并发上限，多个大文件同时下载时总请求数也不会翻倍
+        self._chunk_sem = asyncio.Semaphore(self.download_workers)
+        # 单条媒体消息由固定数量的后台协程从队列中取出处理，限制同时进行的下载数
+        self.media_workers = max(1, config.get("media_workers", 4))
+        self._media_queue = None
+        self._media_worker_tasks = []
         self._ensure_directories()
 
     def _ensure_directories(self):
@@ -31,162 +276,234 @@ class TelegramHandler:
             TELEGRAM_OTHERS_DIR,
             DOUYIN_DEST_DIR,
         ]:
-            os.makedirs(directory, exist_ok=True)
+            self._ensure_dir(directory)
+
+    def _ensure_dir(self, path):
+        """确保目录存在，已创建过的目录不再重复调用 makedirs"""
+        ensure_dirs(path)
+
+    def _reserve_target(self, target_dir, stem, ext):
+        """确保目标目录存在并占用目标文件名"""
+        self._ensure_dir(target_dir)
+        return reserve_unique_path(target_dir, stem, ext)
 
     def _sanitize_filename(self, filename):
         """清理文件名中的非法字符"""
-        # 移除Windows和Linux中的非法文件名字符
-        illegal_chars = r'[<>:"/\\|?*\x00-\x1f]'
-        filename = re.sub(illegal_chars, '', filename)
-        # 移除开头和结尾的点号和空格
-        filename = filename.strip('. ')
-        # 限制文件名长度
-        if len(filename) > 200:
-            filename = filename[:200]
-        return filename
+        return _sanitize(filename)
 
     def _extract_title(self, message_text):
         """从消息文本中提取标题"""
-        if not message_text:
-            return "无标题媒体组"
-            
-        # 尝试匹配【】中的内容
-        pattern = r"【(.*?)】"
-        match = re.search(pattern, message_text)
-        
-        if match:
-            # 找到【】中的内容
-            title_part = match.group(1)
-            
-            # 获取【】后面的内容直到换行或结束
-            rest_of_text = message_text[match.end():].strip()
-            
-            # 如果后面有内容，取直到换行符或#标签之前的部分
-            if rest_of_text:
-                # 找到第一个换行符或#标签的位置
-                end_match = re.search(r"[\n#]", rest_of_text)
-                if end_match:
-                    rest_part = rest_of_text[:end_match.start()].strip()
-                else:
-                    rest_part = rest_of_text
-                
-                # 组合标题
-                title = f"【{title_part}】{rest_part}"
-            else:
-                title = f"【{title_part}】"
-            
-            # 清理标题中的非法文件名字符
-            title = self._sanitize_filename(title)
-            return title
-        
-        # 如果没有找到【】格式的标题，返回原始文本的第一行（直到换行符）
-        first_line = message_text.split('\n')[0].strip()
-        # 移除可能的标签部分（以#开头的内容）
-        first_line = re.sub(r'#.*$', '', first_line).strip()
-        # 清理非法字符
-        first_line = self._sanitize_filename(first_line)
-        
-        return first_line if first_line else "无标题媒体组"
-
-    def _get_media_type_and_dir(self, media):
-        """确定媒体类型和目标目录"""
-        if hasattr(media, "document"):
-            mime_type = media.document.mime_type
-            if mime_type:
-                if mime_type.startswith("video/"):
-                    return "video", TELEGRAM_VIDEOS_DIR
-                elif mime_type.startswith("audio/"):
-                    return "audio", TELEGRAM_AUDIOS_DIR
-            return "other", TELEGRAM_OTHERS_DIR
-        elif hasattr(media, "photo"):
-            return "photo", TELEGRAM_PHOTOS_DIR
-        return "other", TELEGRAM_OTHERS_DIR
-
-    def _get_filename(self, media, message_text=""):
-        """获取文件名"""
-        if hasattr(media, "document"):
-            for attr in media.document.attributes:
-                if hasattr(attr, "file_name") and attr.file_name:
-                    return attr.file_name
-                elif hasattr(attr, "title") and attr.title:
-                    return f"{attr.title}.{media.document.mime_type.split('/')[-1]}"
-
-            # 如果没有找到文件名，使用MIME类型生成
-            if hasattr(media.document, "mime_type"):
-                ext = media.document.mime_type.split("/")[-1]
-                return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
-
-        elif hasattr(media, "photo"):
-            return f"photo_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jpg"
+        return _extract_title_cached(message_text)
+
+    def _get_filename(self, info, message_text=""):
+        """获取不含扩展名的文件名，扩展名统一由 info.ext 提供"""
+        if info.orig_name:
+            return info.orig_name.removesuffix(info.ext)
+        if info.title:
+            return info.title.removesuffix(info.ext)
+
+        # 如果没有找到文件名，使用MIME类型生成
+        if info.kind == "photo":
+            return f"photo_{_unique_suffix()}"
+        if info.mime:
+            return _unique_suffix()
 
         # 从消息文本中提取标题作为文件名
         title = self._extract_title(message_text)
         if title:
             return title
-            
-        return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+        return _unique_suffix()
 
     async def process_media(self, event):
-        """处理Telegram媒体消息"""
+        """处理Telegram媒体消息：放入队列由后台协程处理，等待并返回处理结果"""
+        if self._media_queue is None:
+            # 首次调用时（已有运行中的事件循环）再启动后台协程；
+            # 队列有上限，积压过多时新消息在入队处等待
+            self._media_queue = asyncio.Queue(maxsize=self.media_workers * 4)
+            self._media_worker_tasks = [
+                asyncio.create_task(self._media_worker())
+                for _ in range(self.media_workers)
+            ]
+        future = asyncio.get_running_loop().create_future()
+        await self._media_queue.put((event, future))
+        return await future
+
+    async def _media_worker(self):
+        """后台协程：按到达顺序从队列中取出媒体消息并处理"""
+        while True:
+            event, future = await self._media_queue.get()
+            try:
+                result = await self._process_media(event)
+                # 调用方可能已取消等待
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            finally:
+                self._media_queue.task_done()
+
+    async def close(self):
+        """停止后台协程，并取消仍在队列中等待的消息"""
+        for task in self._media_worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._media_worker_tasks, return_exceptions=True)
+        self._media_worker_tasks = []
+        if self._media_queue is not None:
+            while not self._media_queue.empty():
+                _, future = self._media_queue.get_nowait()
+                future.cancel()
+            self._media_queue = None
+
+    async def _process_media(self, event):
+        """下载并保存单条媒体消息"""
         try:
-            media = event.message.media
+            message = event.message
+            media = message.media
             if not media:
                 return False, "没有检测到媒体文件"
+            text = message.message or ""
 
-            # 获取媒体类型和目标目录
-            media_type, target_dir = self._get_media_type_and_dir(media)
+            # 解析媒体信息，确定媒体类型和目标目录
+            info = inspect_media(media)
+            media_type = info.kind
+            target_dir = _dir_for(info)
 
             # 获取文件名
-            filename = self._get_filename(media, event.message.message)
-            
-            # 如果文件名是时间戳格式或者不包含中文，但消息文本中有中文，使用提取的标题
-            if (not re.search("[\u4e00-\u9fff]+", filename) or 
-                f"{datetime.now().strftime('%Y%m%d_%H%M%S')}" in filename) and re.search(r"[\u4e00-\u9fff]+", event.message.message):
-                extracted_title = self._extract_title(event.message.message)
+            filename = self._get_filename(info, text)
+
+            # 如果文件名不包含中文（包括自动生成的文件名），但消息文本中有中文，使用提取的标题
+            if not _has_cjk(filename) and _has_cjk(text):
+                extracted_title = self._extract_title(text)
                 if extracted_title:
                     filename = extracted_title
 
-            # 下载文件
-            downloaded_file = await event.message.download_media(file=TELEGRAM_TEMP_DIR)
+            # 确定目标文件路径：原子地占用目标文件名，重名时自动追加后缀
+            # 文件系统操作放到线程中执行，与下载同时进行，不必等待磁盘操作完成再开始下载
+            reserve = asyncio.create_task(
+                asyncio.to_thread(self._reserve_target, target_dir, filename, info.ext)
+            )
 
-            if not downloaded_file:
-                return False, "文件下载失败"
+            # 直接下载到目标目录下的临时 .part 文件，完成后重命名，避免跨设备复制
+            part_path = f"{target_dir}{os.sep}.{_unique_suffix()}.part"
+            saved = False
+            try:
+                downloaded_file = await self._download(message, part_path)
+                if not downloaded_file:
+                    return False, "文件下载失败"
+                target_path = await reserve
+                # 同一目录内重命名只改元数据，直接执行：放到线程中的话，
+                # 被取消时无法确定重命名是否已完成，清理可能误删已保存的文件
+                os.replace(downloaded_file, target_path)
+                saved = True
+            finally:
+                if not saved:
+                    # 失败、出错或被取消时删除临时文件，占位文件在占位完成后删除；
+                    # 这里不再 await，协程再次被取消也不会留下文件
+                    _remove_quietly(part_path)
+                    reserve.add_done_callback(_discard_reserved)
 
-            # 移动文件到目标目录
-            ext = os.path.splitext(downloaded_file)[1]
-            target_path = os.path.join(target_dir, f"{filename}{ext}")
-            target_path = target_path.replace(".x-flac", "").replace(".mp4.m4a", ".m4a")
-            if os.path.exists(target_path):
-                filename = f"{filename}_{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext}"
-                target_path = os.path.join(target_dir, filename)
-
-            target_path = target_path.replace(ext + ext, ext)
-
-            success, result = move_file(downloaded_file, target_path)
-
-            if success:
-                return True, {
-                    "type": media_type,
-                    "path": result,
-                    "filename": os.path.basename(result),
-                }
-            else:
-                return False, f"移动文件失败: {result}"
+            return True, {
+                "type": media_type,
+                "path": target_path,
+                "filename": os.path.basename(target_path),
+            }
 
         except Exception as e:
             logger.error(f"处理Telegram媒体文件时出错: {str(e)}")
             return False, str(e)
 
+    async def _download(self, message, path):
+        """下载消息中的媒体到 path，大文件分块并发下载"""
+        media = message.media
+        document = media.document if isinstance(media, MessageMediaDocument) else None
+        size = getattr(document, "size", None) or 0
+        if self.download_workers > 1 and size >= _PARALLEL_MIN_SIZE:
+            try:
+                await self._download_parallel(message.client, document, size, path)
+                return path
+            except FloodWaitError as e:
+                # 并发请求被限流时，等待结束后改为顺序下载
+                logger.warning(f"分块下载触发限流，{e.seconds} 秒后改为顺序下载")
+                await asyncio.sleep(e.seconds)
+        return await message.download_media(file=path)
+
+    async def _download_parallel(self, client, document, size, path):
+        """按块并发请求文件内容，按偏移写入预先分配好大小的文件"""
+        total = -(-size // _CHUNK_SIZE)
+        workers = min(self.download_workers, total)
+        stride = workers * _CHUNK_SIZE
+
+        async def worker(index):
+            # 第 index 个协程负责第 index、index+workers … 块，整个文件只创建一个迭代器
+            # limit 只需不小于块数；取 _CHUNK_SIZE 使 offset 能被整除，Telethon 才使用直接下载，
+            # 实际取多少块由 count 控制，不会请求超出文件末尾的偏移
+            offset = index * _CHUNK_SIZE
+            count = len(range(index, total, workers))
+            async with client.iter_download(
+                document,
+                offset=offset,
+                stride=stride,
+                limit=_CHUNK_SIZE,
+                request_size=_CHUNK_SIZE,
+                file_size=size,
+            ) as chunks:
+                for _ in range(count):
+                    async with self._chunk_sem:
+                        chunk = await anext(chunks)
+                    # 单块只有 512KB，直接写入：放到线程中的话，协程被取消后写入仍在进行，
+                    # 可能落到关闭后被复用的文件描述符上
+                    os.pwrite(fd, chunk, offset)
+                    offset += stride
+
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        tasks = []
+        # 不支持原生 fallocate 的文件系统（NFS、FUSE 等）上 glibc 会逐块写满文件，放到线程中执行；
+        # 直接使用 run_in_executor 返回的 Future（不是任务），它只在线程结束后才完成
+        prealloc = asyncio.get_running_loop().run_in_executor(
+            None, _preallocate, fd, size
+        )
+        try:
+            await asyncio.shield(prealloc)
+            tasks = [asyncio.create_task(worker(i)) for i in range(workers)]
+            await asyncio.gather(*tasks)
+        finally:
+            # 任一块失败时先停下其余协程，再关闭文件描述符
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if prealloc.done():
+                os.close(fd)
+            else:
+                # 被取消时预分配线程可能仍在使用描述符，等线程结束后再关闭
+                prealloc.add_done_callback(functools.partial(_close_after, fd))
+
     async def process_media_group(self, group_id, media_files, caption):
         """处理媒体组文件"""
+        # 整理过程全是建目录、移动文件等阻塞操作，放到线程中执行，不阻塞事件循环
+        return await asyncio.to_thread(
+            self._process_media_group_sync, group_id, media_files, caption
+        )
+
+    def _process_media_group_sync(self, group_id, media_files, caption):
+        """在工作线程中整理媒体组文件"""
         try:
             logger.info(f"开始处理媒体组 {group_id}, 包含 {len(media_files)} 个文件")
             
-            # 统计文件信息
+            # 一次遍历完成图片、视频和其他文件的分类与统计
+            photos, videos, others = [], [], []
+            for f in media_files:
+                if f["type"] == "photo":
+                    photos.append(f)
+                elif f["type"] == "video":
+                    videos.append(f)
+                else:
+                    others.append(f)
             total_files = len(media_files)
-            photo_count = sum(1 for f in media_files if f['type'] == 'photo')
-            video_count = sum(1 for f in media_files if f['type'] == 'video')
-            other_count = total_files - photo_count - video_count
+            photo_count = len(photos)
+            video_count = len(videos)
+            other_count = len(others)
             
             logger.info(f"媒体组 {group_id} 统计: {total_files}个文件, {photo_count}张图片, {video_count}个视频, {other_count}个其他文件")
             
@@ -194,28 +511,34 @@ class TelegramHandler:
             directory_name = self._extract_title(caption)
             
             # 创建媒体组专属目录（在TELEGRAM_VIDEOS_DIR下）
-            group_dir = os.path.join(TELEGRAM_VIDEOS_DIR, directory_name)
-            os.makedirs(group_dir, exist_ok=True)
-            
-            # 分离图片、视频和其他文件
-            photos = [f for f in media_files if f['type'] == 'photo']
-            videos = [f for f in media_files if f['type'] == 'video']
-            others = [f for f in media_files if f['type'] == 'other']
-            
+            group_dir = _VIDEOS_PREFIX + directory_name
+            self._ensure_dir(group_dir)
+
+            # 一次性获取目录中已有的文件名，后续冲突检测在内存中完成
+            try:
+                with os.scandir(group_dir) as entries:
+                    existing = {entry.name for entry in entries}
+            except FileNotFoundError:
+                # 目录在运行期间被移走或删除：重新创建，此时目录为空
+                ensure_dirs(group_dir, refresh=True)
+                existing = set()
+
             # 处理图片命名
             photo_renames = {}
             for i, photo in enumerate(photos):
                 temp_path = photo['temp_path']
+                # 普通图片为 .jpg；以文件形式发送的图片保留原扩展名
+                ext = os.path.splitext(photo["original_filename"])[1] or ".jpg"
+
+                if i == 0:  # 第一张图片命名为fanart
+                    new_filename = f"fanart{ext}"
+                else:  # 其他图片命名为snapshot
+                    new_filename = f"snapshot{i}{ext}"
                 
-                if i == 0:  # 第一张图片命名为fanart.jpg
-                    new_filename = "fanart.jpg"
-                else:  # 其他图片命名为snapshot.jpg
-                    new_filename = f"snapshot{i}.jpg"
-                
-                target_path = os.path.join(group_dir, new_filename)
+                target_path = f"{group_dir}{os.sep}{new_filename}"
                 
                 # 移动文件
-                shutil.move(temp_path, target_path)
+                fast_move(temp_path, target_path)
                 photo_renames[photo['original_filename']] = new_filename
                 logger.info(f"图片重命名: {photo['original_filename']} -> {new_filename}")
             
@@ -232,13 +555,15 @@ class TelegramHandler:
                     # 如果有多个视频，添加序号
                     new_filename = f"{directory_name}_{i+1}{original_ext}"
                 
-                # 清理文件名中的非法字符
-                new_filename = self._sanitize_filename(new_filename)
+                # 清理文件名中的非法字符，并避免覆盖目录中已有的文件
+                new_filename = _unique_name(
+                    self._sanitize_filename(new_filename), existing
+                )
                 
-                target_path = os.path.join(group_dir, new_filename)
+                target_path = f"{group_dir}{os.sep}{new_filename}"
                 
                 # 移动文件
-                shutil.move(temp_path, target_path)
+                fast_move(temp_path, target_path)
                 video_names[video['original_filename']] = new_filename
                 logger.info(f"视频重命名: {video['original_filename']} -> {new_filename}")
             
@@ -247,14 +572,19 @@ class TelegramHandler:
             for other in others:
                 temp_path = other['temp_path']
                 original_filename = other['original_filename']
-                
-                target_path = os.path.join(group_dir, original_filename)
+                # 与已有文件重名时追加序号
+                new_filename = _unique_name(original_filename, existing)
+
+                target_path = f"{group_dir}{os.sep}{new_filename}"
                 
                 # 移动文件
-                shutil.move(temp_path, target_path)
-                other_names[original_filename] = original_filename
-                logger.info(f"其他文件保持原名: {original_filename}")
+                fast_move(temp_path, target_path)
+                other_names[original_filename] = new_filename
+                logger.info(f"其他文件: {original_filename} -> {new_filename}")
             
+            # 合并所有重命名结果，同名时优先级：图片 > 视频 > 其他
+            all_renames = {**other_names, **video_names, **photo_renames}
+
             # 构建详细的统计信息
             group_info = {
                 'group_id': group_id,
@@ -267,18 +597,18 @@ class TelegramHandler:
                 'other_count': other_count,
                 'photo_renames': photo_renames,
                 'video_names': list(video_names.values()),
-                'other_names': list(other_names.keys()),
+                'other_names': list(other_names.values()),
                 'processed_at': datetime.now().isoformat(),
                 'file_list': [
                     {
                         'original_name': f['original_filename'],
-                        'final_name': photo_renames.get(f['original_filename'], 
-                                      video_names.get(f['original_filename'], 
-                                      other_names.get(f['original_filename'], f['original_filename']))),
-                        'type': f['type']
+                        'final_name': all_renames.get(
+                            f['original_filename'], f['original_filename']
+                        ),
+                        'type': f['type'],
                     }
                     for f in media_files
-                ]
+                ],
             }
             
             logger.info(f"媒体组 {group_id} 处理完成: {group_info}")
@@ -286,11 +616,8 @@ class TelegramHandler:
             
         except Exception as e:
             logger.error(f"处理媒体组时出错: {str(e)}")
-            # 清理临时文件
+            # 清理临时文件（已移走或不存在的文件直接忽略，不再逐个 stat）
             for media_file in media_files:
-                if os.path.exists(media_file['temp_path']):
-                    try:
-                        os.remove(media_file['temp_path'])
-                    except:
-                        pass
+                with contextlib.suppress(OSError):
+                    os.remove(media_file["temp_path"])
             return False, str(e)
@@ -8,6 +8,9 @@ from ..constants import YOUTUBE_TEMP_DIR, YOUTUBE_DEST_DIR, YOUTUBE_AUDIO_DIR
 
 logger = logging.getLogger(__name__)
 
+# 从（播放列表）链接中提取视频ID
+_VIDEO_ID_RE = re.compile(r"(?:v=|/)([0-9A-Za-z_-]{11})(?:[&?#]|$)")
+
 
 class YouTubeHandler:
     def __init__(self, config):
@@ -103,7 +106,7 @@ class YouTubeHandler:
     def _extract_single_video_url(self, url):
         """从播放列表URL中提取单个视频的URL"""
         # 尝试从带有播放列表的URL中提取视频ID
-        video_id_match = re.search(r"(?:v=|/)([0-9A-Za-z_-]{11})(?:[&?#]|$)", url)
+        video_id_match = _VIDEO_ID_RE.search(url)
         if video_id_match:
             video_id = video_id_match.group(1)
             return f"https://www.youtube.com/watch?v={video_id}"
@@ -245,24 +248,25 @@ class YouTubeHandler:
 
         # 处理下载的所有文件(视频和音频)
         downloaded_files = []
-        for file in os.listdir(YOUTUBE_TEMP_DIR):
-            if video_id in file:
-                source_path = os.path.join(YOUTUBE_TEMP_DIR, file)
-                file_ext = os.path.splitext(file)[1][1:]  # 获取扩展名（去掉点）
-
-                # 根据文件类型选择保存目录
-                is_audio = file_ext.lower() in ["mp3", "m4a", "ogg", "wav", "flac"]
-                target_dir = YOUTUBE_AUDIO_DIR if is_audio else YOUTUBE_DEST_DIR
-
-                target_path = os.path.join(
-                    target_dir, f"{sanitize_filename(video_title)}.{file_ext}"
-                )
-
-                success, result = move_file(source_path, target_path)
-                if success:
-                    downloaded_files.append(target_path)
-                else:
-                    logger.error(f"移动文件失败: {result}")
+        safe_title = sanitize_filename(video_title)
+        # scandir 的目录项自带完整路径，无需再逐个拼接
+        with os.scandir(YOUTUBE_TEMP_DIR) as entries:
+            matched = [entry for entry in entries if video_id in entry.name]
+        for entry in matched:
+            source_path = entry.path
+            file_ext = os.path.splitext(entry.name)[1][1:]  # 获取扩展名（去掉点）
+
+            # 根据文件类型选择保存目录
+            is_audio = file_ext.lower() in ["mp3", "m4a", "ogg", "wav", "flac"]
+            target_dir = YOUTUBE_AUDIO_DIR if is_audio else YOUTUBE_DEST_DIR
+
+            target_path = os.path.join(target_dir, f"{safe_title}.{file_ext}")
+
+            success, result = move_file(source_path, target_path)
+            if success:
+                downloaded_files.append(target_path)
+            else:
+                logger.error(f"移动文件失败: {result}")
 
         if downloaded_files:
             # 如果启用了音频转换，并且有对应格式的音频文件，返回音频文件
@@ -1,31 +1,149 @@
 import os
-import re
+import errno
 import shutil
+import threading
 import logging
+from collections import OrderedDict
 
 logger = logging.getLogger(__name__)
 
+# 文件名中的非法字符统一替换为下划线（模块加载时构建转换表）
+_ILLEGAL_TABLE = str.maketrans(dict.fromkeys('<>:"/\\|?*', "_"))
+
+# 进程内已确认存在的目录；媒体组等场景会不断产生新目录，按最近使用淘汰以限制内存
+_ENSURED_DIRS = OrderedDict()
+_ENSURED_DIRS_SIZE = 1024
+_ENSURED_DIRS_LOCK = threading.Lock()
+
 
 def sanitize_filename(s):
     """清理文件名中的非法字符"""
-    s = re.sub(r'[<>:"/\\|?*]', "_", s)
-    s = re.sub(r"\s+", " ", s)
-    s = s.strip()
-    return s
+    # 替换非法字符后按空白切分再拼接，一次完成连续空白合并与首尾空白去除
+    return " ".join(s.translate(_ILLEGAL_TABLE).split())
 
 
-def ensure_dirs(*dirs):
-    """确保目录存在"""
+def ensure_dirs(*dirs, refresh=False):
+    """确保目录存在，已创建过的目录不再重复调用 makedirs；refresh 为真时忽略缓存重新创建"""
     for dir_path in dirs:
+        # 可能在 asyncio.to_thread 的工作线程中调用，缓存的读写需要加锁
+        with _ENSURED_DIRS_LOCK:
+            if refresh:
+                _ENSURED_DIRS.pop(dir_path, None)
+            elif dir_path in _ENSURED_DIRS:
+                _ENSURED_DIRS.move_to_end(dir_path)
+                continue
+        # makedirs 在锁外执行，慢速磁盘上不阻塞其他线程
         os.makedirs(dir_path, exist_ok=True)
+        with _ENSURED_DIRS_LOCK:
+            _ENSURED_DIRS[dir_path] = None
+            if len(_ENSURED_DIRS) > _ENSURED_DIRS_SIZE:
+                _ENSURED_DIRS.popitem(last=False)
+
+
+def _copy_file_range(source_path, target_path):
+    """用 copy_file_range 在内核中复制文件内容，不支持时返回 False"""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    try:
+        with open(source_path, "rb") as src, open(target_path, "wb") as dst:
+            src_fd, dst_fd = src.fileno(), dst.fileno()
+            remaining = os.fstat(src_fd).st_size
+            try:
+                while remaining > 0:
+                    copied = os.copy_file_range(src_fd, dst_fd, remaining)
+                    if copied == 0:
+                        # 部分文件系统不支持时直接返回 0 而不报错，同样交给 shutil 处理
+                        return False
+                    remaining -= copied
+            except OSError as e:
+                # 老内核或跨文件系统类型时不支持，交给 shutil 处理
+                if e.errno in (
+                    errno.EXDEV,
+                    errno.ENOSYS,
+                    errno.EINVAL,
+                    errno.EOPNOTSUPP,
+                ):
+                    return False
+                raise
+        shutil.copystat(source_path, target_path)
+    except BaseException:
+        # 复制失败时删除不完整的目标文件，源文件保持不变
+        try:
+            os.remove(target_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return True
+
+
+def fast_move(source_path, target_path):
+    """移动文件：同一文件系统内直接 rename，跨设备时优先用 copy_file_range 复制"""
+    try:
+        _move(source_path, target_path)
+    except FileNotFoundError:
+        # 目标目录在运行期间被移走或删除时，重新创建后再试一次
+        target_dir = os.path.dirname(target_path)
+        if not target_dir or os.path.isdir(target_dir):
+            raise
+        ensure_dirs(target_dir, refresh=True)
+        _move(source_path, target_path)
+
+
+def _move(source_path, target_path):
+    """rename 失败于跨设备时退回复制"""
+    try:
+        os.replace(source_path, target_path)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # 确认复制的字节数与源文件一致后才删除源文件
+        if _copy_file_range(source_path, target_path) and (
+            os.path.getsize(target_path) == os.path.getsize(source_path)
+        ):
+            os.unlink(source_path)
+        else:
+            shutil.move(source_path, target_path)
 
 
 def move_file(source_path, target_path, create_dirs=True):
     """移动文件到目标位置"""
     try:
         if create_dirs:
-            os.makedirs(os.path.dirname(target_path), exist_ok=True)
-        shutil.move(source_path, target_path)
+            ensure_dirs(os.path.dirname(target_path))
+        fast_move(source_path, target_path)
         return True, target_path
     except Exception as e:
         return False, str(e)
+
+
+def reserve_unique_path(directory, stem, ext):
+    """在 directory 中以独占方式创建占位文件 stem+ext，已存在时依次追加 _1、_2 … 后缀，返回实际占用的路径"""
+    # 路径前缀只拼接一次，冲突时只替换后缀部分
+    prefix = f"{directory}{os.sep}{stem}"
+    name_prefix = f"{stem}_"
+    target_path = f"{prefix}{ext}"
+    existing = None
+    counter = 0
+    refreshed = False
+    while True:
+        try:
+            fd = os.open(target_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileNotFoundError:
+            # 目录在运行期间被移走或删除时，重新创建后再试一次
+            if refreshed:
+                raise
+            refreshed = True
+            ensure_dirs(directory, refresh=True)
+            continue
+        except FileExistsError:
+            # 首次冲突时读取一次目录，在内存中跳过已被占用的序号，避免逐个尝试
+            if existing is None:
+                with os.scandir(directory) as entries:
+                    existing = {entry.name for entry in entries}
+            counter += 1
+            while name_prefix + str(counter) + ext in existing:
+                counter += 1
+            target_path = f"{prefix}_{counter}{ext}"
+            continue
+        os.close(fd)
+        return target_path
@@ -0,0 +1,91 @@
+import errno
+import os
+import shutil
+
+import pytest
+
+from src.utils import file_utils
+from src.utils.file_utils import ensure_dirs, fast_move, reserve_unique_path
+
+
+def _force_exdev(monkeypatch):
+    """让 os.replace 总是报跨设备错误，走复制分支"""
+
+    def replace(src, dst):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(file_utils.os, "replace", replace)
+
+
+def test_reserve_unique_path_skips_taken_names(tmp_path):
+    for name in ("a.mp4", "a_1.mp4", "a_3.mp4"):
+        (tmp_path / name).touch()
+
+    first = reserve_unique_path(str(tmp_path), "a", ".mp4")
+    second = reserve_unique_path(str(tmp_path), "a", ".mp4")
+
+    assert os.path.basename(first) == "a_2.mp4"
+    assert os.path.basename(second) == "a_4.mp4"
+    assert os.path.getsize(first) == 0
+
+
+def test_reserve_unique_path_recreates_removed_dir(tmp_path):
+    directory = str(tmp_path / "group")
+    ensure_dirs(directory)
+    shutil.rmtree(directory)
+
+    path = reserve_unique_path(directory, "a", ".mp4")
+
+    assert path == os.path.join(directory, "a.mp4")
+    assert os.path.exists(path)
+
+
+def test_fast_move_recreates_removed_target_dir(tmp_path):
+    target_dir = str(tmp_path / "group")
+    ensure_dirs(target_dir)
+    shutil.rmtree(target_dir)
+    source = tmp_path / "source"
+    source.write_bytes(b"data")
+
+    fast_move(str(source), os.path.join(target_dir, "target"))
+
+    assert (tmp_path / "group" / "target").read_bytes() == b"data"
+    assert not source.exists()
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "copy_file_range"), reason="需要 os.copy_file_range"
+)
+def test_copy_file_range_zero_return_falls_back(tmp_path, monkeypatch):
+    _force_exdev(monkeypatch)
+    monkeypatch.setattr(file_utils.os, "copy_file_range", lambda *args: 0)
+    source = tmp_path / "source"
+    source.write_bytes(b"x" * 100_000)
+    target = tmp_path / "target"
+
+    fast_move(str(source), str(target))
+
+    assert target.read_bytes() == b"x" * 100_000
+    assert not source.exists()
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "copy_file_range"), reason="需要 os.copy_file_range"
+)
+def test_copy_file_range_error_removes_partial_target(tmp_path, monkeypatch):
+    _force_exdev(monkeypatch)
+
+    def copy_file_range(src, dst, count):
+        os.write(dst, b"partial")
+        raise OSError(errno.EIO, "Input/output error")
+
+    monkeypatch.setattr(file_utils.os, "copy_file_range", copy_file_range)
+    source = tmp_path / "source"
+    source.write_bytes(b"x" * 100_000)
+    target = tmp_path / "target"
+
+    with pytest.raises(OSError):
+        fast_move(str(source), str(target))
+
+    assert not target.exists()
+    assert source.read_bytes() == b"x" * 100_000
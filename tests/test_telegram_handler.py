@@ -0,0 +1,173 @@
+import asyncio
+import os
+import random
+import re
+import time
+
+import pytest
+
+from src.handlers import telegram_handler
+from src.handlers.telegram_handler import (
+    _CHUNK_SIZE,
+    TelegramHandler,
+    _split_bracket_title,
+)
+
+# 改用 str.find 解析之前的正则，用于对比解析结果
+_OLD_TITLE_RE = re.compile(r"【(?P<brand>[^】\n]*)】\s*(?P<tail>[^\n#]*)")
+
+needs_proc_fd = pytest.mark.skipif(
+    not os.path.isdir("/proc/self/fd"), reason="需要 /proc/self/fd 统计文件描述符"
+)
+
+
+def _old_split(text):
+    match = _OLD_TITLE_RE.search(text)
+    if not match:
+        return None
+    return match.group("brand"), match.group("tail").strip()
+
+
+def _open_fds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def test_split_bracket_title_matches_old_regex():
+    rng = random.Random(0)
+    alphabet = ["【", "】", "\n", "#", " ", "\t", "　", "a", "标", "题"]
+    for _ in range(20000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 16)))
+        assert _split_bracket_title(text) == _old_split(text), repr(text)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("【品牌】 标题 #标签", ("品牌", "标题")),
+        ("前言【跨\n行】\n【品牌】\n\n标题\n正文", ("品牌", "标题")),
+        ("没有括号", None),
+        ("【未闭合", None),
+    ],
+)
+def test_split_bracket_title_examples(text, expected):
+    assert _split_bracket_title(text) == expected
+
+
+class _FakeDownload:
+    """模拟 Telethon 的下载迭代器：按 offset/stride 返回 data 的分块"""
+
+    def __init__(self, client, offset, stride, request_size):
+        self.client = client
+        self.offset = offset
+        self.stride = stride
+        self.request_size = request_size
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        offset = self.offset
+        if offset in self.client.fail_at:
+            raise ConnectionError(f"chunk at {offset} failed")
+        if offset in self.client.hang_at:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(0)
+        chunk = self.client.data[offset : offset + self.request_size]
+        if not chunk:
+            raise StopAsyncIteration
+        self.offset += self.stride
+        return chunk
+
+
+class _FakeClient:
+    def __init__(self, data, fail_at=(), hang_at=()):
+        self.data = data
+        self.fail_at = set(fail_at)
+        self.hang_at = set(hang_at)
+        self.iterators = []
+
+    def iter_download(
+        self, document, *, offset, stride, limit, request_size, file_size
+    ):
+        assert file_size == len(self.data)
+        iterator = _FakeDownload(self, offset, stride, request_size)
+        self.iterators.append(iterator)
+        return iterator
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    monkeypatch.setattr(TelegramHandler, "_ensure_directories", lambda self: None)
+    return TelegramHandler({"download_workers": 3})
+
+
+@pytest.mark.asyncio
+async def test_download_parallel_writes_every_chunk(handler, tmp_path):
+    data = os.urandom(_CHUNK_SIZE * 7 + 1234)
+    client = _FakeClient(data)
+    path = str(tmp_path / "file.part")
+
+    await handler._download_parallel(client, object(), len(data), path)
+
+    with open(path, "rb") as f:
+        assert f.read() == data
+    # 每个协程只创建一个按步长前进的迭代器
+    assert [it.stride for it in client.iterators] == [3 * _CHUNK_SIZE] * 3
+    assert all(it.closed for it in client.iterators)
+
+
+@needs_proc_fd
+@pytest.mark.asyncio
+async def test_download_parallel_failure_stops_workers_and_closes_fd(handler, tmp_path):
+    data = os.urandom(_CHUNK_SIZE * 7)
+    client = _FakeClient(data, fail_at={4 * _CHUNK_SIZE}, hang_at={2 * _CHUNK_SIZE})
+    path = str(tmp_path / "file.part")
+    fds = _open_fds()
+
+    with pytest.raises(ConnectionError):
+        await asyncio.wait_for(
+            handler._download_parallel(client, object(), len(data), path), 5
+        )
+
+    assert all(it.closed for it in client.iterators)
+    assert _open_fds() == fds
+
+
+@needs_proc_fd
+@pytest.mark.asyncio
+async def test_download_parallel_cancel_waits_for_preallocate(
+    handler, tmp_path, monkeypatch
+):
+    events = []
+
+    def slow_preallocate(fd, size):
+        time.sleep(0.3)
+        # 线程结束时描述符必须仍然有效
+        os.fstat(fd)
+        events.append("preallocated")
+
+    monkeypatch.setattr(telegram_handler, "_preallocate", slow_preallocate)
+    data = os.urandom(_CHUNK_SIZE * 2)
+    path = str(tmp_path / "file.part")
+    fds = _open_fds()
+
+    task = asyncio.create_task(
+        handler._download_parallel(_FakeClient(data), object(), len(data), path)
+    )
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # 取消后描述符等到预分配线程结束才关闭
+    assert _open_fds() == fds + 1
+    await asyncio.sleep(0.5)
+    assert events == ["preallocated"]
+    assert _open_fds() == fds